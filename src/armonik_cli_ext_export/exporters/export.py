@@ -1,13 +1,36 @@
+import importlib
+from typing import Dict, List, Optional
+
 import rich_click as click
-from .mongodb import mongodb_export_command
-from .prometheus import prometheus_export_command
 
 
-@click.group(name="export")
+class LazyGroup(click.RichGroup):
+    """Group whose subcommands are only imported when they are looked up, so that running one
+    command doesn't pay for importing the others"""
+
+    def __init__(self, *args, lazy_commands: Dict[str, str], **kwargs):
+        super().__init__(*args, **kwargs)
+        # Command name -> "module:attribute", the module being relative to this package
+        self.lazy_commands = lazy_commands
+
+    def list_commands(self, ctx: click.Context) -> List[str]:
+        return sorted([*super().list_commands(ctx), *self.lazy_commands])
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> Optional[click.Command]:
+        if cmd_name in self.lazy_commands:
+            module_name, attribute = self.lazy_commands[cmd_name].split(":")
+            return getattr(importlib.import_module(module_name, __package__), attribute)
+        return super().get_command(ctx, cmd_name)
+
+
+@click.group(
+    name="export",
+    cls=LazyGroup,
+    lazy_commands={
+        "mongodb": ".mongodb:mongodb_export_command",
+        "prometheus": ".prometheus:prometheus_export_command",
+    },
+)
 def export_group():
     """Export various resources out of ArmoniK."""
     pass
-
-
-export_group.add_command(mongodb_export_command, name="mongodb")
-export_group.add_command(prometheus_export_command, name="prometheus")
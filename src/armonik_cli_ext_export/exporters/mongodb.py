@@ -1,7 +1,10 @@
+import copy
+import shlex
 import sys
+import textwrap
 import uuid
 from datetime import datetime
-from typing import Optional
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
 
 from armonik_cli_ext_export.utils import (
     console,
@@ -9,115 +12,131 @@ from armonik_cli_ext_export.utils import (
     wait_for_job_completion,
 )
 
-from kr8s.objects import Job
 import rich_click as click
 from rich.panel import Panel
 
+if TYPE_CHECKING:
+    from kr8s.objects import Job
+
+
+# Static part of the export Job spec, the per-export fields are filled in on a copy. The Job is
+# indexed, each pod exporting the collection matching its completion index
+MONGODB_EXPORT_JOB_TEMPLATE: dict = {
+    "apiVersion": "batch/v1",
+    "kind": "Job",
+    "metadata": {},
+    "spec": {
+        "template": {
+            "spec": {
+                "containers": [
+                    {
+                        "name": "sling",
+                        "image": "slingdata/sling",
+                        "command": ["/bin/sh", "-c"],
+                        "args": [],
+                        "env": [
+                            {
+                                "name": "MONGO_USER",
+                                "valueFrom": {"secretKeyRef": {"name": None, "key": "username"}},
+                            },
+                            {
+                                "name": "MONGO_PASS",
+                                "valueFrom": {"secretKeyRef": {"name": None, "key": "password"}},
+                            },
+                            {
+                                "name": "MONGO_HOST",
+                                "valueFrom": {"secretKeyRef": {"name": None, "key": "host"}},
+                            },
+                            {
+                                "name": "MONGO_PORT",
+                                "valueFrom": {"secretKeyRef": {"name": None, "key": "port"}},
+                            },
+                        ],
+                        "volumeMounts": [
+                            {
+                                "name": "mongodb-cert",
+                                "mountPath": "/mongodb/certs",
+                                "readOnly": True,
+                            }
+                        ],
+                    }
+                ],
+                "restartPolicy": "Never",
+                "volumes": [
+                    {
+                        "name": "mongodb-cert",
+                        "secret": {
+                            "secretName": None,
+                            "items": [{"key": "chain.pem", "path": "chain.pem"}],
+                        },
+                    }
+                ],
+            }
+        },
+        "backoffLimit": 4,
+        "completionMode": "Indexed",
+    },
+}
+
+
+# Script run by the export pods: the credentials come from the environment, and the pod runs the
+# Sling command of the collection matching its completion index. Values are shell-quoted when
+# the commands are rendered
+SLING_SCRIPT_TEMPLATE = textwrap.dedent(
+    """\
+    export MONGODB="mongodb://$MONGO_USER:$MONGO_PASS@$MONGO_HOST:$MONGO_PORT/database?ssl=true&tlsInsecure=true"
+    case "$JOB_COMPLETION_INDEX" in
+    {sling_commands}
+    esac
+    """
+)
+SLING_COMMAND_TEMPLATE = "{index}) sling run --src-conn MONGODB --src-stream {stream} --tgt-conn S3 --tgt-object {target} ;;"
+
 
 def create_mongodb_export_job(
     namespace: str,
-    collection_name: str,
+    s3_keys: Dict[str, str],
     s3_bucket: str,
-    s3_key: str,
     aws_credentials: Optional[dict] = None,
     mongodb_secret: str = "mongodb",
-) -> Job:
-    """Create a Kubernetes Job to export MongoDB data to S3"""
+    parallelism: int = 4,
+) -> "Job":
+    """Create a Kubernetes Job to export MongoDB collections to S3, given as collection -> S3 key"""
     # Generate a unique job name
-    job_name = f"mongo-export-{collection_name.lower()}-{str(uuid.uuid4())[:8]}"
+    if len(s3_keys) == 1:
+        job_name = f"mongo-export-{next(iter(s3_keys)).lower()}-{str(uuid.uuid4())[:8]}"
+    else:
+        job_name = f"mongo-export-{str(uuid.uuid4())[:8]}"
 
-    # Prepare AWS environment variables
-    aws_env = []
+    # Fill in a copy of the job spec template
+    job_spec = copy.deepcopy(MONGODB_EXPORT_JOB_TEMPLATE)
+    job_spec["metadata"] = {"name": job_name, "namespace": namespace}
+    job_spec["spec"]["completions"] = len(s3_keys)
+    job_spec["spec"]["parallelism"] = min(len(s3_keys), parallelism)
+    pod_spec = job_spec["spec"]["template"]["spec"]
+    container = pod_spec["containers"][0]
+    sling_commands = "\n".join(
+        SLING_COMMAND_TEMPLATE.format(
+            index=index,
+            stream=shlex.quote(f"database.{collection_name}"),
+            target=shlex.quote(f"s3://{s3_bucket}/{s3_key}"),
+        )
+        for index, (collection_name, s3_key) in enumerate(s3_keys.items())
+    )
+    container["args"] = [SLING_SCRIPT_TEMPLATE.format(sling_commands=sling_commands)]
+    for env in container["env"]:
+        env["valueFrom"]["secretKeyRef"]["name"] = mongodb_secret
+    pod_spec["volumes"][0]["secret"]["secretName"] = mongodb_secret
+
+    # Add AWS environment variables
     if aws_credentials:
-        for key, value in aws_credentials.items():
-            aws_env.append({"name": key, "value": value})
-
-    # Create the job spec
-    job_spec = {
-        "apiVersion": "batch/v1",
-        "kind": "Job",
-        "metadata": {"name": job_name, "namespace": namespace},
-        "spec": {
-            "template": {
-                "spec": {
-                    "containers": [
-                        {
-                            "name": "sling",
-                            "image": "slingdata/sling",
-                            "command": ["/bin/sh", "-c"],
-                            "args": [
-                                f"""
-                            # Use the environment variables directly
-                            export MONGODB="mongodb://$MONGO_USER:$MONGO_PASS@$MONGO_HOST:$MONGO_PORT/database?ssl=true&tlsInsecure=true"
-                            # Run the Sling command
-                            sling run --src-conn MONGODB --src-stream 'database.{collection_name}' --tgt-conn S3 --tgt-object "s3://{s3_bucket}/{s3_key}"
-                            """
-                            ],
-                            "env": [
-                                {
-                                    "name": "MONGO_USER",
-                                    "valueFrom": {
-                                        "secretKeyRef": {
-                                            "name": mongodb_secret,
-                                            "key": "username",
-                                        }
-                                    },
-                                },
-                                {
-                                    "name": "MONGO_PASS",
-                                    "valueFrom": {
-                                        "secretKeyRef": {
-                                            "name": mongodb_secret,
-                                            "key": "password",
-                                        }
-                                    },
-                                },
-                                {
-                                    "name": "MONGO_HOST",
-                                    "valueFrom": {
-                                        "secretKeyRef": {
-                                            "name": mongodb_secret,
-                                            "key": "host",
-                                        }
-                                    },
-                                },
-                                {
-                                    "name": "MONGO_PORT",
-                                    "valueFrom": {
-                                        "secretKeyRef": {
-                                            "name": mongodb_secret,
-                                            "key": "port",
-                                        }
-                                    },
-                                },
-                            ]
-                            + aws_env,
-                            "volumeMounts": [
-                                {
-                                    "name": "mongodb-cert",
-                                    "mountPath": "/mongodb/certs",
-                                    "readOnly": True,
-                                }
-                            ],
-                        }
-                    ],
-                    "restartPolicy": "Never",
-                    "volumes": [
-                        {
-                            "name": "mongodb-cert",
-                            "secret": {
-                                "secretName": mongodb_secret,
-                                "items": [{"key": "chain.pem", "path": "chain.pem"}],
-                            },
-                        }
-                    ],
-                }
-            },
-            "backoffLimit": 4,
-        },
-    }
+        container["env"].extend(
+            {"name": key, "value": value} for key, value in aws_credentials.items()
+        )
+
+    # Create the job, kr8s is imported here as it is slow to import
+    from kr8s.objects import Job
 
-    # Create the job
     try:
         job = Job(job_spec)
         job.create()
@@ -130,7 +149,7 @@ def create_mongodb_export_job(
         raise click.ClickException(f"Failed to create Kubernetes Job: {e}")
 
 
-@click.command()
+@click.command(name="mongodb")
 @click.option(
     "--namespace",
     default="armonik",
@@ -145,13 +164,25 @@ def create_mongodb_export_job(
 )
 @click.option(
     "--collection",
-    default="TaskData",
-    help="Collection name to backup",
+    "collections",
+    multiple=True,
+    default=("TaskData",),
+    help="Collection name to backup, can be repeated to export several collections",
     show_default=True,
 )
 @click.option("--s3-bucket", required=True, help="S3 bucket name to upload to")
-@click.option("--s3-key", help="S3 object key/path (auto-generated if not provided)")
+@click.option(
+    "--s3-key",
+    help="S3 object key/path (auto-generated if not provided, only for a single collection)",
+)
 @click.option("--aws-profile", help="AWS profile to use for S3 upload")
+@click.option(
+    "--parallelism",
+    type=click.IntRange(min=1),
+    default=4,
+    help="Maximum number of collections exported at the same time",
+    show_default=True,
+)
 @click.option("--wait/--no-wait", default=False, help="Wait for the job to complete")
 @click.option(
     "--timeout",
@@ -163,10 +194,11 @@ def create_mongodb_export_job(
 def mongodb_export_command(
     namespace: str,
     mongodb_secret: str,
-    collection: str,
+    collections: Tuple[str, ...],
     s3_bucket: str,
     s3_key: Optional[str],
     aws_profile: Optional[str],
+    parallelism: int,
     wait: bool,
     timeout: int,
 ):
@@ -176,7 +208,8 @@ def mongodb_export_command(
     Export MongoDB collections to S3 using Kubernetes Jobs with the Sling data tool.
 
     This tool creates a Kubernetes Job that uses Sling to export data from a MongoDB
-    collection directly to an S3 bucket.
+    collection directly to an S3 bucket. Several collections are exported by a single indexed
+    Job, running up to `--parallelism` of them at the same time.
 
     **Examples:**
 
@@ -190,6 +223,11 @@ def mongodb_export_command(
     armonik export mongodb --collection Users --s3-bucket my-bucket --s3-key exports/users/backup.json
     ```
 
+    Export several collections at once:
+    ```bash
+    armonik export mongodb --collection TaskData --collection Result --s3-bucket my-bucket
+    ```
+
     Export and wait for completion:
     ```bash
     armonik export mongodb --s3-bucket my-bucket --wait --timeout 1200
@@ -198,11 +236,18 @@ def mongodb_export_command(
 
     # Show a nice header
 
-    # Generate S3 key if not provided
-    if not s3_key:
+    # Generate S3 keys if not provided
+    if s3_key:
+        if len(set(collections)) > 1:
+            raise click.UsageError("--s3-key can only be used when exporting a single collection")
+        s3_keys = {collections[0]: s3_key}
+    else:
         timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-        s3_key = f"exports/{collection}/{timestamp}.json"
-        console.print(f"Auto-generated S3 key: [bold]{s3_key}[/]")
+        s3_keys = {
+            collection: f"exports/{collection}/{timestamp}.json" for collection in collections
+        }
+        for generated_key in s3_keys.values():
+            console.print(f"Auto-generated S3 key: [bold]{generated_key}[/]")
 
     # Get AWS credentials if profile is provided
     aws_credentials = None
@@ -223,9 +268,10 @@ def mongodb_export_command(
         f"""[bold]Export Configuration:[/]
         
 • Namespace: [white]{namespace}[/]
-• Collection: [white]{collection}[/]
+• Collections: [white]{", ".join(s3_keys)}[/]
 • S3 Bucket: [white]{s3_bucket}[/]
-• S3 Key: [white]{s3_key}[/]
+• S3 Keys: [white]{", ".join(s3_keys.values())}[/]
+• Parallelism: [white]{min(len(s3_keys), parallelism)}[/]
 • MongoDB Secret: [white]{mongodb_secret}[/]
 • AWS Profile: [white]{aws_profile or "None (using default credentials)"}[/]
 • Wait for completion: [white]{"Yes" if wait else "No"}[/]
@@ -241,11 +287,11 @@ def mongodb_export_command(
     try:
         job = create_mongodb_export_job(
             namespace=namespace,
-            collection_name=collection,
+            s3_keys=s3_keys,
             s3_bucket=s3_bucket,
-            s3_key=s3_key,
             aws_credentials=aws_credentials,
             mongodb_secret=mongodb_secret,
+            parallelism=parallelism,
         )
 
         # Wait for job completion if requested
@@ -254,10 +300,11 @@ def mongodb_export_command(
             success = wait_for_job_completion(job, timeout)
 
             if success:
+                destinations = ", ".join(f"s3://{s3_bucket}/{key}" for key in s3_keys.values())
                 console.print(
                     Panel(
                         f"[green]✅ Export completed successfully![/]\n\n"
-                        f"Your data has been exported to: [bold]s3://{s3_bucket}/{s3_key}[/]",
+                        f"Your data has been exported to: [bold]{destinations}[/]",
                         title="🎉 Success",
                         style="green",
                     )
@@ -1,28 +1,47 @@
-import os
+import contextlib
+import copy
+import io
+import queue
+import shlex
 import sys
 import uuid
 import tempfile
-import tarfile
+import shutil
+import threading
 import subprocess
-from typing import Optional
+import textwrap
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import IO, TYPE_CHECKING, List, Optional
 from armonik_cli_ext_export.utils import (
+    S3_MAX_POOL_CONNECTIONS,
     console,
     get_aws_credentials,
+    get_s3_client,
     wait_for_job_completion,
 )
 
-import boto3
-from kr8s.objects import Job, Pod
 import rich_click as click
 from rich.panel import Panel
 
+# boto3 and kr8s are slow to import, they are only imported when actually used
+if TYPE_CHECKING:
+    from kr8s.objects import Job, Pod
 
-def find_prometheus_pod(namespace: str) -> Pod:
+PROMETHEUS_LABEL_SELECTOR = "app.kubernetes.io/name=prometheus"
+
+
+def find_prometheus_pod(namespace: str) -> "Pod":
     """Find the Prometheus pod in the specified namespace using kr8s"""
+    from kr8s.objects import Pod
+
     try:
-        pods = Pod.list(namespace=namespace)
+        # Let the API server do the filtering through the standard name label
+        for pod in Pod.list(namespace=namespace, label_selector=PROMETHEUS_LABEL_SELECTOR):
+            return pod
 
-        for pod in pods:
+        # Fall back to scanning all the pods for deployments that don't set the label
+        for pod in Pod.list(namespace=namespace):
             if pod.name.startswith("prometheus"):
                 return pod
 
@@ -32,35 +51,145 @@ def find_prometheus_pod(namespace: str) -> Pod:
         raise click.ClickException("Failed to find Prometheus pod")
 
 
-def upload_to_s3(
-    file_path: str,
-    bucket_name: str,
-    s3_key: str,
-    aws_credentials: Optional[dict] = None,
-):
-    """Upload file to S3 using boto3"""
-    try:
-        # Create S3 client with credentials if provided
-        if aws_credentials:
-            s3_client = boto3.client(
-                "s3",
-                aws_access_key_id=aws_credentials["AWS_ACCESS_KEY_ID"],
-                aws_secret_access_key=aws_credentials["AWS_SECRET_ACCESS_KEY"],
-                aws_session_token=aws_credentials.get("AWS_SESSION_TOKEN", ""),
-            )
+class S3MultipartWriter:
+    """Write-only file-like object that streams its content to S3 as a multipart upload.
+
+    Data is buffered until a part is full, then the part is uploaded in the background while
+    writing goes on. The number of parts in flight is bounded by `max_concurrency`, which also
+    bounds memory usage to roughly `max_concurrency * part_size_mb` MiB.
+    """
+
+    def __init__(
+        self,
+        s3_client,
+        bucket_name: str,
+        s3_key: str,
+        part_size_mb: int = 16,
+        max_concurrency: int = 16,
+    ):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.s3_key = s3_key
+        self.part_size = part_size_mb * 1024 * 1024
+        self._buffer = io.BytesIO()
+        self._futures: List[Future] = []
+        self._error: Optional[BaseException] = None
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._upload_id = s3_client.create_multipart_upload(Bucket=bucket_name, Key=s3_key)[
+            "UploadId"
+        ]
+
+    def __enter__(self) -> "S3MultipartWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.complete()
         else:
-            # Use default credentials
-            s3_client = boto3.client("s3")
+            self.abort()
+
+    def write(self, data: bytes) -> int:
+        self._buffer.write(data)
+        if self._buffer.tell() >= self.part_size:
+            self._upload_part()
+        return len(data)
+
+    def _upload_part(self):
+        if self._error is not None:
+            raise self._error
+
+        # Wait for a free slot so that at most max_concurrency parts are held in memory
+        self._slots.acquire()
+        part_number = len(self._futures) + 1
+        body = self._buffer.getvalue()
+        self._buffer = io.BytesIO()
+
+        future = self._executor.submit(self._send_part, part_number, body)
+        future.add_done_callback(self._on_part_done)
+        self._futures.append(future)
+
+    def _send_part(self, part_number: int, body: bytes) -> dict:
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket_name,
+            Key=self.s3_key,
+            PartNumber=part_number,
+            UploadId=self._upload_id,
+            Body=body,
+        )
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
 
-        # Upload file
-        s3_client.upload_file(file_path, bucket_name, s3_key)
-        console.print(
-            f"[green]✓[/green] File uploaded to S3: [bold]s3://{bucket_name}/{s3_key}[/bold]"
+    def _on_part_done(self, future: Future):
+        self._slots.release()
+        if not future.cancelled() and future.exception() is not None:
+            self._error = future.exception()
+
+    def complete(self):
+        """Upload the remaining buffered data and assemble the parts into the final object"""
+        try:
+            # S3 requires at least one part, even if it is empty
+            if self._buffer.tell() or not self._futures:
+                self._upload_part()
+            parts = [future.result() for future in self._futures]
+        except BaseException:
+            self.abort()
+            raise
+        self._executor.shutdown()
+        self.s3_client.complete_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=self.s3_key,
+            UploadId=self._upload_id,
+            MultipartUpload={"Parts": parts},
         )
 
-    except Exception as e:
-        console.print(f"[red]✗ Error uploading to S3: {e}[/red]")
-        raise click.ClickException(f"Failed to upload to S3: {e}")
+    def abort(self):
+        """Cancel pending parts and discard the ones already uploaded"""
+        for future in self._futures:
+            future.cancel()
+        self._executor.shutdown()
+        self.s3_client.abort_multipart_upload(
+            Bucket=self.bucket_name, Key=self.s3_key, UploadId=self._upload_id
+        )
+
+
+def gzip_stream(source: IO[bytes], destination, chunk_size: int):
+    """Gzip the content of source into destination.
+
+    Reading happens on a separate thread feeding a bounded queue, so that reading, compressing and
+    writing all overlap (zlib releases the GIL while compressing).
+    """
+    chunks: queue.Queue = queue.Queue(maxsize=4)
+    stop = threading.Event()
+
+    def read_chunks():
+        try:
+            while not stop.is_set():
+                chunk = source.read(chunk_size)
+                chunks.put(chunk)
+                if not chunk:
+                    break
+        except Exception as e:
+            chunks.put(e)
+
+    reader = threading.Thread(target=read_chunks, daemon=True)
+    reader.start()
+    try:
+        # wbits=31 produces a gzip container instead of a raw zlib stream
+        compressor = zlib.compressobj(wbits=31)
+        while True:
+            chunk = chunks.get()
+            if isinstance(chunk, Exception):
+                raise chunk
+            if not chunk:
+                break
+            destination.write(compressor.compress(chunk))
+        destination.write(compressor.flush())
+    finally:
+        # Unblock the reader if we stopped early, so that it can notice it has to stop
+        stop.set()
+        while not chunks.empty():
+            chunks.get_nowait()
+        reader.join()
 
 
 def backup_local_mode(
@@ -68,52 +197,143 @@ def backup_local_mode(
     filename: str,
     bucket_name: str,
     aws_credentials: Optional[dict] = None,
+    part_size_mb: int = 16,
+    max_concurrency: int = 16,
 ):
-    """Perform backup using local kubectl copy method"""
-    console.print("Using Kubernetes copy method")
+    """Perform backup by streaming the data directory out of the pod with kubectl exec"""
+    console.print("Using Kubernetes exec method")
 
     # Find Prometheus pod using kr8s
     console.print("Finding Prometheus pod...")
     prometheus_pod = find_prometheus_pod(namespace)
     console.print(f"Found Prometheus pod: [bold cyan]{prometheus_pod.name}[/bold cyan]")
 
-    with tempfile.TemporaryDirectory() as temp_dir:
-        local_path = os.path.join(temp_dir, filename)
-        tar_file_path = f"{local_path}.tar.gz"
-
-        # Copy data from pod (using subprocess as kr8s doesn't support file copying)
-        with console.status("Copying data from Prometheus pod..."):
-            try:
-                copy_cmd = [
-                    "kubectl",
-                    "cp",
-                    f"{prometheus_pod.name}:/prometheus/",
-                    local_path,
-                    "-n",
-                    namespace,
-                ]
-                subprocess.run(copy_cmd, check=True, capture_output=True)
-            except subprocess.CalledProcessError as e:
-                console.print(f"[red]✗ Error copying from pod: {e}[/red]")
-                raise click.ClickException("Failed to copy file from pod")
-
-        console.print("[green]✓[/green] Data directory copied from pod successfully")
-
-        # Create tar file
-        with console.status("Creating tar archive..."):
-            try:
-                with tarfile.open(tar_file_path, "w:gz") as tar:
-                    tar.add(local_path, arcname=filename)
-            except Exception as e:
-                console.print(f"[red]✗ Error creating tar file: {e}[/]")
-                raise click.ClickException("Failed to create tar file")
-
-        console.print(f"[green]✓[/] Directory tarred successfully: [bold]{filename}.tar.gz[/]")
-
-        # Upload to S3
-        with console.status("Uploading to S3..."):
-            s3_key = f"{filename}.tar.gz"
-            upload_to_s3(tar_file_path, bucket_name, s3_key, aws_credentials)
+    # Archive the data directory inside the pod and stream it to S3 as it comes out of kubectl,
+    # so nothing is written to local disk (kr8s doesn't support exec streaming, hence kubectl).
+    # The archive is compressed locally rather than by the busy Prometheus pod, with pigz on all
+    # the cores if it is installed, in process otherwise
+    pigz = shutil.which("pigz")
+    commands = [
+        [
+            "kubectl",
+            "exec",
+            "-n",
+            namespace,
+            prometheus_pod.name,
+            "--",
+            "tar",
+            "cf",
+            "-",
+            "-C",
+            "/",
+            "prometheus",
+        ]
+    ]
+    if pigz:
+        commands.append([pigz, "-c"])
+
+    s3_key = f"{filename}.tar.gz"
+    with console.status("Streaming data from Prometheus pod to S3..."):
+        try:
+            with tempfile.TemporaryFile() as stderr, S3MultipartWriter(
+                get_s3_client(
+                    aws_credentials["AWS_ACCESS_KEY_ID"],
+                    aws_credentials["AWS_SECRET_ACCESS_KEY"],
+                    aws_credentials.get("AWS_SESSION_TOKEN", ""),
+                )
+                if aws_credentials
+                else get_s3_client(),
+                bucket_name,
+                s3_key,
+                part_size_mb=part_size_mb,
+                max_concurrency=max_concurrency,
+            ) as writer:
+                with contextlib.ExitStack() as stack:
+                    processes: List[subprocess.Popen] = []
+                    for command in commands:
+                        stdin = processes[-1].stdout if processes else None
+                        processes.append(
+                            stack.enter_context(
+                                subprocess.Popen(
+                                    command, stdin=stdin, stdout=subprocess.PIPE, stderr=stderr
+                                )
+                            )
+                        )
+                        # Only the next process reads this pipe now
+                        if stdin is not None:
+                            stdin.close()
+                    assert processes[-1].stdout is not None
+                    if pigz:
+                        shutil.copyfileobj(processes[-1].stdout, writer, writer.part_size)
+                    else:
+                        gzip_stream(processes[-1].stdout, writer, writer.part_size)
+                for command, process in zip(commands, processes):
+                    if process.returncode != 0:
+                        stderr.seek(0)
+                        raise subprocess.CalledProcessError(
+                            process.returncode, command, stderr=stderr.read().decode()
+                        )
+        except subprocess.CalledProcessError as e:
+            console.print(f"[red]✗ Error copying from pod: {e} {e.stderr}[/red]")
+            raise click.ClickException("Failed to copy file from pod")
+        except Exception as e:
+            console.print(f"[red]✗ Error uploading to S3: {e}[/]")
+            raise click.ClickException(f"Failed to upload to S3: {e}")
+
+    console.print(f"[green]✓[/green] File uploaded to S3: [bold]s3://{bucket_name}/{s3_key}[/bold]")
+
+
+# Static part of the backup Job spec, the per-backup fields are filled in on a copy
+PROMETHEUS_BACKUP_JOB_TEMPLATE: dict = {
+    "apiVersion": "batch/v1",
+    "kind": "Job",
+    "metadata": {},
+    "spec": {
+        "template": {
+            "spec": {
+                "containers": [
+                    {
+                        "name": "prom-snap",
+                        "image": "richarvey/awscli:latest",
+                        "env": [],
+                        "command": ["sh", "-c"],
+                        "args": [],
+                        "volumeMounts": [
+                            {
+                                "name": "prometheus-volume",
+                                "mountPath": "/prometheus",
+                            }
+                        ],
+                    }
+                ],
+                "restartPolicy": "OnFailure",
+                "volumes": [
+                    {
+                        "name": "prometheus-volume",
+                        "persistentVolumeClaim": {"claimName": "prometheus"},
+                    }
+                ],
+                "ttlSecondsAfterFinished": 120,
+            }
+        },
+        "backoffLimit": 4,
+    },
+}
+
+
+# Script run by the backup pod. The archive is piped straight to S3, so it never has to fit in the
+# pod's ephemeral storage, and compression overlaps with the upload. Compression uses pigz on all
+# the cores when it can be installed, gzip otherwise. The size of the uncompressed data is an
+# upper bound of the archive size, which the AWS CLI needs to pick large enough parts
+BACKUP_SCRIPT_TEMPLATE = textwrap.dedent(
+    """\
+    set -e -o pipefail
+    command -v pigz >/dev/null || apk add --no-cache pigz >/dev/null 2>&1 || true
+    if command -v pigz >/dev/null; then COMPRESS="pigz -p $(nproc)"; else COMPRESS=gzip; fi
+    SIZE=$(( $(du -sk /prometheus | cut -f1) * 1024 ))
+    tar -cf - /prometheus | $COMPRESS | aws s3 cp --expected-size "$SIZE" --cli-write-timeout 0 - {target}
+    """
+)
 
 
 def create_prometheus_backup_job(
@@ -121,58 +341,28 @@ def create_prometheus_backup_job(
     filename: str,
     bucket_name: str,
     aws_credentials: Optional[dict] = None,
-) -> Job:
+) -> "Job":
     """Create a Kubernetes Job to backup Prometheus data to S3"""
     # Generate a unique job name
     job_name = f"prom-s3-{str(uuid.uuid4())[:8]}"
 
-    # Prepare AWS environment variables
-    aws_env = []
+    # Fill in a copy of the job spec template
+    job_spec = copy.deepcopy(PROMETHEUS_BACKUP_JOB_TEMPLATE)
+    job_spec["metadata"] = {"name": job_name, "namespace": namespace}
+    container = job_spec["spec"]["template"]["spec"]["containers"][0]
+    container["args"] = [
+        BACKUP_SCRIPT_TEMPLATE.format(target=shlex.quote(f"s3://{bucket_name}/{filename}.tar.gz"))
+    ]
+
+    # Add AWS environment variables, only the non-empty ones
     if aws_credentials:
-        for key, value in aws_credentials.items():
-            if value:  # Only add non-empty values
-                aws_env.append({"name": key, "value": value})
-
-    # Create the job spec
-    job_spec = {
-        "apiVersion": "batch/v1",
-        "kind": "Job",
-        "metadata": {"name": job_name, "namespace": namespace},
-        "spec": {
-            "template": {
-                "spec": {
-                    "containers": [
-                        {
-                            "name": "prom-snap",
-                            "image": "richarvey/awscli:latest",
-                            "env": aws_env,
-                            "command": ["sh", "-c"],
-                            "args": [
-                                f"tar -czvf /tmp/{filename}.tar.gz /prometheus && aws s3 cp /tmp/{filename}.tar.gz s3://{bucket_name}/{filename}.tar.gz"
-                            ],
-                            "volumeMounts": [
-                                {
-                                    "name": "prometheus-volume",
-                                    "mountPath": "/prometheus",
-                                }
-                            ],
-                        }
-                    ],
-                    "restartPolicy": "Never",
-                    "volumes": [
-                        {
-                            "name": "prometheus-volume",
-                            "persistentVolumeClaim": {"claimName": "prometheus"},
-                        }
-                    ],
-                    "ttlSecondsAfterFinished": 120,
-                }
-            },
-            "backoffLimit": 4,
-        },
-    }
+        container["env"] = [
+            {"name": key, "value": value} for key, value in aws_credentials.items() if value
+        ]
 
     # Create the job using kr8s
+    from kr8s.objects import Job
+
     try:
         job = Job(job_spec)
         job.create()
@@ -185,7 +375,7 @@ def create_prometheus_backup_job(
         raise click.ClickException(f"Failed to create Kubernetes Job: {e}")
 
 
-@click.command()
+@click.command(name="prometheus")
 @click.option(
     "--namespace",
     default="armonik",
@@ -198,7 +388,7 @@ def create_prometheus_backup_job(
 @click.option(
     "--local/--persistent-volume",
     default=False,
-    help="Use local kubectl copy method instead of Persistent Volume",
+    help="Use local kubectl exec method instead of Persistent Volume",
 )
 @click.option(
     "--wait/--no-wait",
@@ -212,6 +402,20 @@ def create_prometheus_backup_job(
     help="Timeout in seconds when waiting for job completion",
     show_default=True,
 )
+@click.option(
+    "--s3-concurrency",
+    type=click.IntRange(min=1, max=S3_MAX_POOL_CONNECTIONS),
+    default=16,
+    help="Number of parts uploaded to S3 in parallel (only for local mode)",
+    show_default=True,
+)
+@click.option(
+    "--s3-part-size",
+    type=click.IntRange(min=5),
+    default=16,
+    help="Size in MiB of each part of the S3 multipart upload (only for local mode)",
+    show_default=True,
+)
 def prometheus_export_command(
     namespace: str,
     filename: str,
@@ -220,14 +424,16 @@ def prometheus_export_command(
     local: bool,
     wait: bool,
     timeout: int,
+    s3_concurrency: int,
+    s3_part_size: int,
 ):
     """
     **Prometheus S3 Backup Tool**
 
-    Backup Prometheus data to S3 using either local kubectl copy or Kubernetes Jobs.
+    Backup Prometheus data to S3 using either local kubectl exec or Kubernetes Jobs.
 
     This tool provides two backup modes:
-    - Local mode: Uses kubectl to copy data directly from Prometheus pod
+    - Local mode: Uses kubectl to stream data directly from Prometheus pod
     - Persistent Volume mode: Creates a Kubernetes Job to backup from PV
 
     **Examples:**
@@ -267,6 +473,8 @@ def prometheus_export_command(
     if not local and not aws_credentials:
         # Check if we have default AWS credentials
         try:
+            import boto3
+
             boto3.Session().get_credentials()
             console.print("[green]✓[/] Using default AWS credentials")
         except Exception:
@@ -278,7 +486,7 @@ def prometheus_export_command(
             raise click.ClickException("Missing AWS credentials")
 
     # Display configuration
-    mode_text = "Local (kubectl copy)" if local else "Persistent Volume (Kubernetes Job)"
+    mode_text = "Local (kubectl exec)" if local else "Persistent Volume (Kubernetes Job)"
     creds_text = (
         "Not required (local mode)"
         if local
@@ -303,7 +511,14 @@ def prometheus_export_command(
     try:
         if local:
             console.print("\nStarting local backup...")
-            backup_local_mode(namespace, filename, s3_bucket, aws_credentials)
+            backup_local_mode(
+                namespace,
+                filename,
+                s3_bucket,
+                aws_credentials,
+                part_size_mb=s3_part_size,
+                max_concurrency=s3_concurrency,
+            )
 
             console.print(
                 Panel(
@@ -1,74 +1,230 @@
-from typing import Optional
-import boto3
+from typing import TYPE_CHECKING, Optional, Tuple
 
 from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn, TimeElapsedColumn
-from kr8s.objects import Job
 
+import contextlib
+import functools
+import hashlib
+import json
+import os
+import queue
+import threading
 import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# boto3 and kr8s are slow to import, they are only imported when actually used
+if TYPE_CHECKING:
+    from kr8s.objects import Job
 
 console = Console()
 
 
+# Temporary credentials (SSO, assumed roles...) are cached on disk, like the AWS CLI does in
+# ~/.aws/cli/cache, so that consecutive runs don't have to go through STS/SSO again
+CREDENTIALS_CACHE_DIR = Path.home() / ".cache" / "armonik-cli-ext-export" / "aws"
+CREDENTIALS_EXPIRY_MARGIN = timedelta(seconds=60)
+
+
+def _credentials_cache_path(profile_name: str) -> Path:
+    return CREDENTIALS_CACHE_DIR / f"{hashlib.sha1(profile_name.encode()).hexdigest()}.json"
+
+
+def _read_cached_credentials(profile_name: str) -> Optional[dict]:
+    """Return the cached credentials of the profile, unless missing or about to expire"""
+    try:
+        entry = json.loads(_credentials_cache_path(profile_name).read_text())
+        expiration = datetime.fromisoformat(entry["Expiration"])
+        credentials = entry["Credentials"]
+    except (OSError, ValueError, KeyError):
+        return None
+    if expiration - datetime.now(timezone.utc) <= CREDENTIALS_EXPIRY_MARGIN:
+        return None
+    return credentials
+
+
+def _write_cached_credentials(profile_name: str, credentials: dict, expiration: datetime):
+    """Cache the credentials of the profile, readable by the current user only"""
+    cache_path = _credentials_cache_path(profile_name)
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(cache_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as cache_file:
+            json.dump(
+                {"Credentials": credentials, "Expiration": expiration.isoformat()}, cache_file
+            )
+    except OSError:
+        # Caching is only an optimization, the credentials are still usable
+        pass
+
+
+# Resolved once per profile for the whole invocation, the returned dict must not be modified
+@functools.lru_cache(maxsize=16)
 def get_aws_credentials(profile_name: Optional[str] = None) -> Optional[dict]:
     """Get AWS credentials from the specified profile"""
     if profile_name:
+        cached_credentials = _read_cached_credentials(profile_name)
+        if cached_credentials:
+            return cached_credentials
         try:
+            import boto3
+
             session = boto3.Session(profile_name=profile_name)
             credentials = session.get_credentials()
             if credentials:
                 frozen_credentials = credentials.get_frozen_credentials()
-                return {
+                aws_credentials = {
                     "AWS_ACCESS_KEY_ID": frozen_credentials.access_key,
                     "AWS_SECRET_ACCESS_KEY": frozen_credentials.secret_key,
                     "AWS_SESSION_TOKEN": frozen_credentials.token
                     if frozen_credentials.token
                     else "",
                 }
+                # Only temporary credentials have an expiry time, static ones are cheap to load
+                expiry_time = getattr(credentials, "_expiry_time", None)
+                if expiry_time:
+                    _write_cached_credentials(profile_name, aws_credentials, expiry_time)
+                return aws_credentials
         except Exception as e:
             console.print(f"[red]Error getting AWS credentials: {e}[/red]")
     return None
 
 
-def wait_for_job_completion(job: Job, timeout_seconds: int = 600) -> bool:
+# Seconds between two status lines when waiting for a job outside of a terminal
+NON_INTERACTIVE_STATUS_INTERVAL = 30
+
+# Parts of multipart uploads are sent concurrently, the pool must have a connection for each
+S3_MAX_POOL_CONNECTIONS = 64
+
+
+@functools.lru_cache(maxsize=8)
+def get_s3_client(
+    access_key: Optional[str] = None,
+    secret_key: Optional[str] = None,
+    session_token: Optional[str] = None,
+):
+    """Get an S3 client for the given credentials, or the default ones if not provided.
+
+    Clients are cached so that their connections are reused for the whole invocation.
+    """
+    import boto3
+    from botocore.config import Config
+
+    config = Config(
+        max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+        retries={"max_attempts": 10, "mode": "adaptive"},
+        tcp_keepalive=True,
+    )
+    if access_key:
+        return boto3.client(
+            "s3",
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            aws_session_token=session_token,
+            config=config,
+        )
+    # Use default credentials
+    return boto3.client("s3", config=config)
+
+
+def _job_outcome(job: "Job") -> Optional[Tuple[bool, str]]:
+    """Return (succeeded, message) if the job reached a terminal condition, None otherwise"""
+    for condition in job.status.get("conditions") or []:
+        if condition["type"] == "Complete" and condition["status"] == "True":
+            return True, ""
+        elif condition["type"] == "Failed" and condition["status"] == "True":
+            return False, condition.get("message", "Unknown error")
+    return None
+
+
+def _watch_job(job: "Job", outcome: queue.Queue, timeout_seconds: int):
+    """Wait until the job completes or fails and put the result in the outcome queue"""
+    deadline = time.monotonic() + timeout_seconds
+    try:
+        while True:
+            # Like kubectl wait: get the job once, then watch it from that resourceVersion so that
+            # the API server only streams the changes. The watch is closed at the deadline
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            job.wait(["condition=Complete", "condition=Failed"], timeout=remaining)
+
+            # wait also returns when the API server ends the watch, in which case we wait again
+            result = _job_outcome(job)
+            if result is not None:
+                outcome.put(result)
+                return
+    except TimeoutError:
+        # The timeout is reported by wait_for_job_completion
+        pass
+    except Exception as e:
+        outcome.put(e)
+
+
+def wait_for_job_completion(job: "Job", timeout_seconds: int = 600) -> bool:
     """Wait for the job to complete and return its status"""
 
-    with Progress(
-        SpinnerColumn(),
-        TextColumn("[progress.description]{task.description}"),
-        TimeElapsedColumn(),
-        console=console,
-        transient=True,
-    ) as progress:
-        task = progress.add_task(f"Waiting for job {job.name} to complete...", total=None)
+    # The job is watched in the background, so that we're notified as soon as it finishes
+    # while the foreground keeps the progress display up to date
+    outcome: queue.Queue = queue.Queue(maxsize=1)
+    threading.Thread(target=_watch_job, args=(job, outcome, timeout_seconds), daemon=True).start()
+
+    # The animated progress display is only useful in a terminal, otherwise (CI, log collectors...)
+    # a plain status line is printed from time to time instead
+    interactive = console.is_terminal
+    refresh_seconds = 1 if interactive else NON_INTERACTIVE_STATUS_INTERVAL
+    progress_display = (
+        Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            TimeElapsedColumn(),
+            console=console,
+            transient=True,
+        )
+        if interactive
+        else contextlib.nullcontext()
+    )
+
+    result = None
+    with progress_display as progress:
+        if progress:
+            task = progress.add_task(f"Waiting for job {job.name} to complete...", total=None)
         start_time = time.time()
 
         while True:
-            job.refresh()
-
-            if "conditions" in job.status and job.status.get("conditions"):
-                for condition in job.status["conditions"]:
-                    if condition["type"] == "Complete" and condition["status"] == "True":
-                        progress.stop()
-                        console.print(f"[green]✓ Job {job.name} completed successfully[/green]")
-                        return True
-                    elif condition["type"] == "Failed" and condition["status"] == "True":
-                        progress.stop()
-                        console.print(
-                            f"[red]✗ Job {job.name} failed: {condition.get('message', 'Unknown error')}[/red]"
-                        )
-                        return False
-
-            # Check for timeout
             elapsed = time.time() - start_time
-            if elapsed > timeout_seconds:
-                progress.stop()
-                console.print(f"[red]✗ Timeout waiting for job {job.name} to complete[/red]")
-                return False
+            try:
+                result = outcome.get(
+                    timeout=max(0, min(refresh_seconds, timeout_seconds - elapsed))
+                )
+            except queue.Empty:
+                pass
+
+            if isinstance(result, Exception):
+                raise result
+
+            # Check for completion or timeout
+            elapsed = time.time() - start_time
+            if result is not None or elapsed >= timeout_seconds:
+                break
 
             # Update progress description with elapsed time
-            progress.update(
-                task,
-                description=f"Waiting for job {job.name} to complete... ({elapsed:.0f}s/{timeout_seconds}s)",
+            description = (
+                f"Waiting for job {job.name} to complete... ({elapsed:.0f}s/{timeout_seconds}s)"
             )
-            time.sleep(5)
+            if progress:
+                progress.update(task, description=description)
+            else:
+                console.print(description)
+
+    if result is None:
+        console.print(f"[red]✗ Timeout waiting for job {job.name} to complete[/red]")
+        return False
+
+    succeeded, message = result
+    if succeeded:
+        console.print(f"[green]✓ Job {job.name} completed successfully[/green]")
+    else:
+        console.print(f"[red]✗ Job {job.name} failed: {message}[/red]")
+    return succeeded